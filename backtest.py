@@ -1,10 +1,78 @@
 
 #Backtest Implementation
 
+import argparse
+import csv
+import numpy as np
 import pandas as pd
 import sys
 from backtesting import Backtest, Strategy as BTStrategy
-from strategy import PullbackStrategy, Candle, Signal
+from strategy import compute_signals, _walk_trades, _completed_trades, _kernel_hash
+
+# Precompiled trade walk (built by `python strategy_aot.py`), only used when it
+# was built from the current kernel source; JIT (or plain Python) otherwise
+try:
+    import strategy_ext
+except ImportError:
+    strategy_ext = None
+
+# Without numba, njit is a no-op and the kernel runs as plain Python
+_fallback_impl = "JIT" if hasattr(_completed_trades, "py_func") else "Python (numba not installed)"
+
+if strategy_ext is None:
+    _walk_impl = _completed_trades
+    WALK_IMPL = f"{_fallback_impl}, strategy_ext not built"
+elif (not hasattr(strategy_ext, "kernel_hash")
+        or strategy_ext.kernel_hash() != _kernel_hash()):
+    _walk_impl = _completed_trades
+    WALK_IMPL = f"{_fallback_impl}, strategy_ext is stale (rerun `python strategy_aot.py`)"
+else:
+    _walk_impl = strategy_ext.walk_trades
+    WALK_IMPL = "AOT (strategy_ext)"
+
+
+def run_backtest(data: pd.DataFrame, symbol: str = "BTCUSDT") -> list[dict]:
+    """
+    Vectorized backtest: enter at close on BUY, exit at close on SELL
+    
+    Same signals and HTF delay as the live trader, without the
+    backtesting.py broker simulation (no SL/TP or fills are modelled).
+    
+    Args:
+        data: LTF candles indexed by timestamp, with "open" and "close" columns
+        symbol: Symbol written to the trade log
+        
+    Returns:
+        Completed trades as dicts, same fields as backtest_trades.csv
+    """
+    open_arr = data["open"].to_numpy(dtype=np.float64)
+    close_arr = data["close"].to_numpy(dtype=np.float64)
+
+    buy_mask, sell_mask = compute_signals(open_arr, close_arr)
+    trades = _walk_impl(buy_mask, sell_mask)
+    entries = trades[:, 0]
+    exits = trades[:, 1]
+
+    timestamps = data.index
+    return [
+        {
+            "symbol": symbol,
+            "direction": "LONG",
+            "entry_time": entry_time,
+            "entry_price": entry_price,
+            "entry_candle": entry + 1,  # 1-based, same numbering as live trader
+            "entry_htf": entry // 5,    # HTF candles available at this candle
+            "exit_time": exit_time,
+            "exit_price": exit_price,
+            "exit_candle": exit + 1,
+            "exit_htf": exit // 5
+        }
+        for entry, exit, entry_time, exit_time, entry_price, exit_price in zip(
+            entries.tolist(), exits.tolist(),
+            timestamps[entries], timestamps[exits],
+            close_arr[entries].tolist(), close_arr[exits].tolist()
+        )
+    ]
 
 
 class PullbackBacktestAdapter(BTStrategy):
@@ -13,31 +81,30 @@ class PullbackBacktestAdapter(BTStrategy):
     
     Key Implementation Details:
     1. HTF Delay: HTF candle becomes available 1 LTF candle AFTER completion
-    2. Same aggregation logic as live trader
-    3. Same signal generation timing
+    2. Signals come from the vectorized compute_signals, not the live
+       trader's per-candle CandleFeed/generate_signal path; check_parity.py
+       keeps the two in lockstep
+    
+    Signals for the whole series are computed once in init(); next() only
+    executes the precomputed entries/exits.
     """
 
     def init(self):
-        """Initialize strategy and buffers"""
-        self.strategy = PullbackStrategy()
+        """Precompute entry/exit candles for the full data set"""
+        buy_mask, sell_mask = compute_signals(self.data.Open, self.data.Close)
+        entries, exits = _walk_trades(buy_mask, sell_mask)
+        self._entries = set(entries.tolist())
+        self._exits = set(exits.tolist())
 
-        # Candle storage
-        self.ltf_candles = []           # All closed LTF candles
-        self.htf_candles = []           # All closed HTF candles
-        self._htf_bucket = []           # Current HTF being built (5 LTF candles)
-        
-        # HTF Delay Implementation
-        self._htf_pending = None        # HTF that just completed (not yet available)
-        self._htf_available_next = False  # Flag: make pending available next tick
+        # Plain Python list: cheap scalar reads in next() (and JIT-friendly under PyPy)
+        self._close = list(self.data.Close)
+        # Full index reference; only read on trade candles, so no per-bar conversion
+        self._timestamps = self.data.index
 
         # Position tracking
         self.current_trade = None
         self.trades_log = []
         
-        # Metrics
-        self.candle_count = 0
-        self.htf_count = 0
-        
         
         print("Backtest Initialized")
        
@@ -47,65 +114,21 @@ class PullbackBacktestAdapter(BTStrategy):
         Called every time a new LTF candle closes
         
         Execution Flow:
-        1. Make pending HTF available (if any)
-        2. Store new LTF candle
-        3. Try to build HTF from 5 LTF candles
-        4. Generate signal
-        5. Execute order
+        1. Look up precomputed signal for this candle
+        2. Execute order
         """
-        self.candle_count += 1
-        timestamp = self.data.index[-1]
-        
-        # make pending hft available
-        # If HTF completed on previous candle, make it available now
-        if self._htf_available_next and self._htf_pending is not None:
-            self.htf_candles.append(self._htf_pending)
-            self.htf_count += 1    
-            
-            self._htf_pending = None
-            self._htf_available_next = False
-        
-        # store new hft candle
-        ltf_candle = Candle(
-            open=self.data.Open[-1],
-            close=self.data.Close[-1]
-        )
-        self.ltf_candles.append(ltf_candle)
-        
-        # aggregate into htf
-        self._htf_bucket.append(ltf_candle)
-        
-        if len(self._htf_bucket) == 5:
-            # collected ltf make an htf
-            htf_candle = Candle(
-                open=self._htf_bucket[0].open,
-                close=self._htf_bucket[-1].close
-            )
-            
-            # Store as pending (will be available next candle)
-            self._htf_pending = htf_candle
-            self._htf_available_next = True
-            self._htf_bucket.clear()
+        i = len(self.data) - 1
+        if i not in self._entries and i not in self._exits:
+            return
 
-        
-        if len(self.ltf_candles) < 2 or len(self.htf_candles) < 1:
-            return  # Not enough data yet
-
-        #  generate signal
-        signal = self.strategy.generate_signal(
-            self.ltf_candles,
-            self.htf_candles,
-            position_open=(self.current_trade is not None)
-        )
-        
-        price = self.data.Close[-1]
+        timestamp = self._timestamps[i]
+        price = self._close[i]
+        candle_number = i + 1       # 1-based, same numbering as live trader
+        htf_number = i // 5         # HTF candles available at this candle
 
         # Execute orders
         
-        if signal == Signal.BUY:
-            if self.current_trade is not None:
-                return  # Already in position
-            
+        if i in self._entries:
             # Open position
             self.buy(size=0.1)
             
@@ -114,21 +137,18 @@ class PullbackBacktestAdapter(BTStrategy):
                 "direction": "LONG",
                 "entry_time": timestamp,
                 "entry_price": price,
-                "entry_candle": self.candle_count,
-                "entry_htf": self.htf_count
+                "entry_candle": candle_number,
+                "entry_htf": htf_number
             }          
-        elif signal == Signal.SELL:
-            if self.current_trade is None:
-                return  # No position to close
-            
+        else:
             # Close position
             self.sell()
             
             self.current_trade.update({
                 "exit_time": timestamp,
                 "exit_price": price,
-                "exit_candle": self.candle_count,
-                "exit_htf": self.htf_count
+                "exit_candle": candle_number,
+                "exit_htf": htf_number
             })                     
             # Log completed trade
             self.trades_log.append(self.current_trade)
@@ -137,11 +157,26 @@ class PullbackBacktestAdapter(BTStrategy):
 
 if __name__ == "__main__":
     
+    parser = argparse.ArgumentParser(description="Pullback strategy backtest")
+    parser.add_argument(
+        "--compat",
+        action="store_true",
+        help="Run through backtesting.py instead of the vectorized engine (cross-validation)"
+    )
+    args = parser.parse_args()
+    
     print("\n Pullback stragegy backtest \n")  
     
     # loading data
     try:
-        data = pd.read_csv("live_candles.csv")
+        # Parse, type and index in one pass
+        data = pd.read_csv(
+            "live_candles.csv",
+            usecols=["timestamp", "open", "close"],
+            dtype={"open": "float64", "close": "float64"},
+            parse_dates=["timestamp"],
+            index_col="timestamp"
+        )
        
     except FileNotFoundError:
         print("\nlive_candles.csv not found")
@@ -149,11 +184,11 @@ if __name__ == "__main__":
         sys.exit(1)
     
     # data preparation
-    data["timestamp"] = pd.to_datetime(data["timestamp"])
-    data.set_index("timestamp", inplace=True)
     data = data[~data.index.duplicated(keep="first")]
     
     print(f"Period: {data.index[0]} to {data.index[-1]}")
+    if not args.compat:
+        print(f"Trade walk: {WALK_IMPL}")
     
     # Check alignment
     first_minute = data.index[0].minute
@@ -164,44 +199,60 @@ if __name__ == "__main__":
     else:
         print(f"Data properly aligned (starts at minute {first_minute})")
     
-    # Convert to backtesting.py format
-    data["Open"] = data["open"]
-    data["High"] = data["open"]
-    data["Low"] = data["open"]
-    data["Close"] = data["close"]
-    data["Volume"] = 1
-    data = data[["Open", "High", "Low", "Close", "Volume"]]
     #running backtests
     
-    bt = Backtest(
-        data,
-        PullbackBacktestAdapter,
-        cash=100_000_000,
-        commission=0.0,
-        exclusive_orders=True
-    )
+    if args.compat:
+        # Convert to backtesting.py format (High/Low are unused by the
+        # strategy, so they share the Open buffer instead of copying it)
+        open_arr = data["open"].to_numpy(dtype=np.float64)
+        close_arr = data["close"].to_numpy(dtype=np.float64)
+        data = pd.DataFrame(
+            {
+                "Open": open_arr,
+                "High": open_arr,
+                "Low": open_arr,
+                "Close": close_arr,
+                "Volume": np.ones(len(open_arr), dtype=np.uint8)
+            },
+            index=data.index,
+            copy=False
+        )
+        
+        bt = Backtest(
+            data,
+            PullbackBacktestAdapter,
+            cash=100_000_000,
+            commission=0.0,
+            exclusive_orders=True
+        )
 
-    stats = bt.run()
+        stats = bt.run()
+        trades_log = stats._strategy.trades_log
+    else:
+        trades_log = run_backtest(data)
     
-    print(f"\nTrades executed: {len(stats._strategy.trades_log)}")
+    print(f"\nTrades executed: {len(trades_log)}")
     
-    if len(stats._strategy.trades_log) > 0:
-        trades_df = pd.DataFrame(stats._strategy.trades_log)
-        trades_df.to_csv("backtest_trades.csv", index=False)
-        print(f"\nSaved {len(trades_df)} trades to backtest_trades.csv")
+    if len(trades_log) > 0:
+        with open("backtest_trades.csv", "w", newline="") as f:
+            writer = csv.DictWriter(f, fieldnames=trades_log[0].keys())
+            writer.writeheader()
+            writer.writerows(trades_log)
+        print(f"\nSaved {len(trades_log)} trades to backtest_trades.csv")
     
         print("TRADE DETAILS")
          
-        for i, trade in enumerate(trades_df.itertuples(), 1):
-            pnl = trade.exit_price - trade.entry_price
-            pnl_pct = (pnl / trade.entry_price) * 100
+        for i, trade in enumerate(trades_log, 1):
+            pnl = trade["exit_price"] - trade["entry_price"]
+            pnl_pct = (pnl / trade["entry_price"]) * 100
             
-            print(f"\nTrade #{i}:")
-            print(f"  Entry:  {trade.entry_time} @ ${trade.entry_price:.2f} "
-                  f"(candle {trade.entry_candle}, HTF {trade.entry_htf})")
-            print(f"  Exit:   {trade.exit_time} @ ${trade.exit_price:.2f} "
-                  f"(candle {trade.exit_candle}, HTF {trade.exit_htf})")
-            print(f"  P&L:    ${pnl:.2f} ({pnl_pct:+.2f}%)")
+            # One write per trade
+            print(f"\nTrade #{i}:\n"
+                  f"  Entry:  {trade['entry_time']} @ ${trade['entry_price']:.2f} "
+                  f"(candle {trade['entry_candle']}, HTF {trade['entry_htf']})\n"
+                  f"  Exit:   {trade['exit_time']} @ ${trade['exit_price']:.2f} "
+                  f"(candle {trade['exit_candle']}, HTF {trade['exit_htf']})\n"
+                  f"  P&L:    ${pnl:.2f} ({pnl_pct:+.2f}%)")
     else:
         print("\n No trades executed")
     
@@ -0,0 +1,90 @@
+"""
+Parity check between the two strategy implementations
+
+- Per-candle (live trading): CandleFeed + PullbackStrategy.generate_signal
+- Vectorized (backtest): compute_signals + _walk_trades
+
+Both are fed the same random open/close series and must produce the same
+entry/exit candles. Run after any change to strategy.py:
+
+    python check_parity.py
+"""
+
+import sys
+
+import numpy as np
+
+from strategy import (
+    CandleFeed, Candle, PullbackStrategy, Signal,
+    compute_signals, _walk_trades
+)
+
+# Configuration
+
+N_SERIES = 300
+MAX_LENGTH = 400
+SEED = 0
+
+
+def per_candle_trades(open_arr, close_arr):
+    """Entry/exit indices from the live trader's per-candle path"""
+    strategy = PullbackStrategy()
+    feed = CandleFeed()
+    position_open = False
+    entries = []
+    exits = []
+
+    for i, (o, c) in enumerate(zip(open_arr.tolist(), close_arr.tolist())):
+        feed.add(Candle(open=o, close=c))
+
+        signal = strategy.generate_signal(
+            feed.prev_ltf,
+            feed.cur_ltf,
+            feed.cur_htf,
+            position_open=position_open
+        )
+
+        # Same execution rules as LiveTrader: BUY only when flat, SELL only when open
+        if signal == Signal.BUY and not position_open:
+            entries.append(i)
+            position_open = True
+        elif signal == Signal.SELL and position_open:
+            exits.append(i)
+            position_open = False
+
+    return entries, exits
+
+
+def vectorized_trades(open_arr, close_arr):
+    """Entry/exit indices from the backtest's vectorized path"""
+    buy_mask, sell_mask = compute_signals(open_arr, close_arr)
+    entries, exits = _walk_trades(buy_mask, sell_mask)
+    return entries.tolist(), exits.tolist()
+
+
+if __name__ == "__main__":
+
+    rng = np.random.default_rng(SEED)
+    mismatches = 0
+
+    for n in range(N_SERIES):
+        length = int(rng.integers(0, MAX_LENGTH))
+        # Coarse price steps so flat candles (open == close) occur too
+        open_arr = 100.0 + rng.integers(-3, 4, length) * 0.5
+        close_arr = open_arr + rng.integers(-2, 3, length) * 0.5
+
+        live = per_candle_trades(open_arr, close_arr)
+        backtest = vectorized_trades(open_arr, close_arr)
+
+        if live != backtest:
+            mismatches += 1
+            print(f"Series #{n} (length {length}): MISMATCH")
+            print(f"  per-candle: entries={live[0]} exits={live[1]}")
+            print(f"  vectorized: entries={backtest[0]} exits={backtest[1]}")
+
+    print(f"\nChecked {N_SERIES} random series: {mismatches} mismatches")
+
+    if mismatches:
+        print("Per-candle and vectorized strategy implementations diverge")
+        sys.exit(1)
+    print("Per-candle and vectorized strategy implementations match")
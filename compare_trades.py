@@ -17,51 +17,51 @@ for df in (backtest_trades, live_trades):
 print("\nTRADE MATCHING VALIDATION")
 print("=" * 60)
 
-matched = 0
-checked = 0
-
 # Validation logic
 
-for _, live_trade in live_trades.iterrows():
-    # Find closest backtest trade by entry time
-    time_diffs = abs(backtest_trades["entry_time"] - live_trade["entry_time"])
-    closest_idx = time_diffs.idxmin()
-    bt_trade = backtest_trades.loc[closest_idx]
-
-    entry_diff = abs(bt_trade["entry_time"] - live_trade["entry_time"])
-    exit_diff = abs(bt_trade["exit_time"] - live_trade["exit_time"])
-    
-    print(f"\nLive trade entry: {live_trade['entry_time']}")
-    
-    # Direction must match
-    if bt_trade["direction"] != live_trade["direction"]:
-        print("Direction mismatch")
-        break
-
-    # Entry timing tolerance
-    if entry_diff > MAX_TIME_DIFF:
-        print(f"Entry time mismatch: {entry_diff}")
-        break
+# Pair every live trade with the closest backtest trade by entry time.
+# The merge key is not suffixed, so keep a copy of the backtest entry time.
+backtest_trades["entry_time_bt"] = backtest_trades["entry_time"]
+merged = pd.merge_asof(
+    live_trades.sort_values("entry_time"),
+    backtest_trades.sort_values("entry_time"),
+    on="entry_time",
+    direction="nearest",
+    tolerance=MAX_TIME_DIFF,
+    suffixes=("_live", "_bt")
+)
+
+entry_diff = (merged["entry_time"] - merged["entry_time_bt"]).abs()
+exit_diff = (merged["exit_time_live"] - merged["exit_time_bt"]).abs()
+
+# Entry timing: a backtest trade within tolerance was found at all
+# Direction must match, exit timing within tolerance
+has_match = merged["entry_time_bt"].notna()
+direction_ok = merged["direction_live"] == merged["direction_bt"]
+exit_ok = exit_diff <= MAX_TIME_DIFF
+is_match = has_match & direction_ok & exit_ok
+
+report = pd.DataFrame({
+    "live_entry": merged["entry_time"],
+    "entry_diff": entry_diff,
+    "exit_diff": exit_diff,
+    "result": is_match.map({True: "OK", False: "FAIL"})
+})
+print(report.to_string(index=False))
 
-    # Exit timing tolerance
-    if exit_diff > MAX_TIME_DIFF:
-        print(f"Exit time mismatch: {exit_diff}")
-        break
-
-    print("Direction match")
-    print(f"Entry time difference: {entry_diff}")
-    print(f"Exit time difference : {exit_diff}")
-
-    matched += 1
-    checked += 1
-    
 # Summary
 
+checked = len(merged)
+matched = int(is_match.sum())
+
 print("\n" + "=" * 60)
 print("SUMMARY")
 print("=" * 60)
 print(f"Validated live trades: {checked}")
 print(f"Matched trades:        {matched}")
+print(f"Entry time mismatches: {int((~has_match).sum())}")
+print(f"Direction mismatches:  {int((has_match & ~direction_ok).sum())}")
+print(f"Exit time mismatches:  {int((has_match & ~exit_ok).sum())}")
 
 if matched == checked:
     print("Trade logic matches between backtest and live execution")
@@ -2,12 +2,16 @@
 Live Trading System for Binance Testnet
 """
 import os
-import time
+import argparse
 import csv
-from datetime import datetime
+import logging
+import threading
+import time
+from datetime import datetime, timedelta
+from binance import ThreadedWebsocketManager
 from binance.client import Client
 from binance.exceptions import BinanceAPIException
-from strategy import PullbackStrategy, Candle, Signal
+from strategy import PullbackStrategy, CandleFeed, Candle, Signal
 from dotenv import load_dotenv
 load_dotenv()
 
@@ -19,6 +23,23 @@ if not API_KEY or not API_SECRET:
         "Missing BINANCE_API_KEY or BINANCE_API_SECRET environment variables"
     )
 
+log = logging.getLogger(__name__)
+
+CANDLE_INTERVAL = timedelta(minutes=1)
+
+# REST polling: retry delay when the newest closed candle is not published yet
+POLL_RETRY_SECONDS = 5
+
+# Flush the candle log every N candles (trades are rare and flushed immediately)
+CANDLE_FLUSH_EVERY = 60
+
+
+def _sleep_to_next_minute():
+    """Sleep until just after the next 1-minute candle close"""
+    # 1.5s margin so the exchange has published the closed candle
+    time.sleep(60 - (time.time() % 60) + 1.5)
+
+
 class LiveTrader:
 
     def __init__(self, api_key: str, api_secret: str, symbol: str = "BTCUSDT"):
@@ -26,28 +47,26 @@ class LiveTrader:
         self.client = Client(api_key, api_secret, testnet=True)
         self.symbol = symbol
         
-        # Strategy (SAME class as backtest)
-        self.strategy = PullbackStrategy()
+        # Market data stream (closed candles pushed by Binance, no polling)
+        self.twm = ThreadedWebsocketManager(
+            api_key=api_key, api_secret=api_secret, testnet=True
+        )
+        self._lock = threading.Lock()   # Candle processing vs shutdown
         
-        # Candle storage
-        self.ltf_candles = []           # All closed LTF candles
-        self.htf_candles = []           # All closed HTF candles
-        self._htf_bucket = []           # Current HTF being built
+        # Strategy (per-candle implementation; the backtest uses the
+        # vectorized compute_signals, kept in lockstep by check_parity.py)
+        self.strategy = PullbackStrategy()
         
-        # HTF Delay Implementation (CRITICAL FOR PARITY)
-        self._htf_pending = None        # HTF that just completed
-        self._htf_available_next = False  # Make available next tick
+        # Candle storage and HTF aggregation (with 1-candle HTF delay)
+        self.feed = CandleFeed()
         
         # Alignment tracking
         self._alignment_complete = False
         
         # Execution state
-        self.last_candle_ts = None
+        self._last_candle_ts = None     # Last closed candle seen (dedup / gap detection)
         self.current_trade = None
-        
-        # Metrics
-        self.candle_count = 0
-        self.htf_count = 0
+        self._last_signal = None        # Last logged signal (log on change)
         
         #  CSV LOGGING 
         # Trade log
@@ -69,37 +88,31 @@ class LiveTrader:
             fieldnames=["timestamp", "open", "close"]
         )
         self.candle_writer.writeheader()
+        self._writes_since_flush = 0
 
-    def fetch_latest_closed_candle(self) -> tuple[Candle, datetime]:
+    def fetch_closed_candles(self, limit: int = 3) -> list[tuple[Candle, datetime]]:
         """
-        Fetch most recent CLOSED 1-minute candle from Binance
+        Fetch the most recent CLOSED 1-minute candles from Binance (REST)
         
+        Args:
+            limit: Klines to request; the last one is still open and dropped
+            
         Returns:
-            (Candle, timestamp)
+            [(Candle, timestamp), ...] oldest first
         """
-        try:
-            # Get last 2 candles
-            klines = self.client.get_klines(
-                symbol=self.symbol,
-                interval=Client.KLINE_INTERVAL_1MINUTE,
-                limit=2
-            )
-            
-            # Use second-to-last (the closed one)
-            k = klines[-2]
-            
-            candle = Candle(
-                open=float(k[1]),
-                close=float(k[4])
+        klines = self.client.get_klines(
+            symbol=self.symbol,
+            interval=Client.KLINE_INTERVAL_1MINUTE,
+            limit=limit
+        )
+        
+        return [
+            (
+                Candle(open=float(k[1]), close=float(k[4])),
+                datetime.fromtimestamp(k[0] / 1000)
             )
-            
-            timestamp = datetime.fromtimestamp(k[0] / 1000)
-            
-            return candle, timestamp
-            
-        except Exception as e:
-            print(f"[ERROR] Failed to fetch candle: {e}")
-            raise
+            for k in klines[:-1]
+        ]
 
     def get_btc_balance(self) -> float:
         """Get available BTC balance"""
@@ -110,7 +123,7 @@ class LiveTrader:
                     return float(b["free"])
             return 0.0
         except Exception as e:
-            print(f"[ERROR] Failed to get balance: {e}")
+            log.error(f"[ERROR] Failed to get balance: {e}")
             return 0.0
     
     def place_market_buy(self, quote_amount: float = 100.0):
@@ -122,10 +135,10 @@ class LiveTrader:
                 type="MARKET",
                 quoteOrderQty=quote_amount
             )
-            print(f"[ORDER] BUY executed: Order ID {order['orderId']}")
+            log.info(f"[ORDER] BUY executed: Order ID {order['orderId']}")
             return order
         except BinanceAPIException as e:
-            print(f"[ERROR] Buy order failed: {e}")
+            log.error(f"[ERROR] Buy order failed: {e}")
             raise
     
     def place_market_sell(self):
@@ -133,7 +146,7 @@ class LiveTrader:
         try:
             qty = self.get_btc_balance()
             if qty <= 0:
-                print("[WARNING] No BTC balance to sell")
+                log.warning("[WARNING] No BTC balance to sell")
                 return None
             
             # Round to valid precision
@@ -145,222 +158,352 @@ class LiveTrader:
                 type="MARKET",
                 quantity=qty
             )
-            print(f"[ORDER]  SELL executed: Order ID {order['orderId']}")
+            log.info(f"[ORDER]  SELL executed: Order ID {order['orderId']}")
             return order
         except BinanceAPIException as e:
-            print(f"[ERROR] Sell order failed: {e}")
+            log.error(f"[ERROR] Sell order failed: {e}")
             raise
 
+    def _log_banner(self, mode: str):
+        """Startup banner shared by run() and run_polling()"""
+        log.info(" LIVE TRADER STARTED\n"
+                 f"Symbol: {self.symbol}\n"
+                 f"LTF: 1 minute\n"
+                 f"HTF: 5 minutes (delayed by 1 LTF candle)\n"
+                 f"Mode: Binance Testnet ({mode})")
+
     def run(self):
         """
-        Main trading loop
+        Start the kline stream and block until interrupted
         
-        Flow:
-        1. Wait for 5-minute alignment
-        2. Make pending HTF available (if any)
-        3. Fetch and store new LTF candle
-        4. Aggregate into HTF
-        5. Generate signal
-        6. Execute order
-        7. Log everything
-        8. Sleep and repeat
+        Candles are processed in _on_kline as soon as Binance reports
+        them closed.
         """        
-        print(" LIVE TRADER STARTED")        
-        print(f"Symbol: {self.symbol}")
-        print(f"LTF: 1 minute")
-        print(f"HTF: 5 minutes (delayed by 1 LTF candle)")
-        print(f"Mode: Binance Testnet")
+        self._log_banner("websocket")
        
+        self.twm.start()
+        self.twm.start_kline_socket(
+            callback=self._on_kline,
+            symbol=self.symbol,
+            interval=Client.KLINE_INTERVAL_1MINUTE
+        )
+        
+        try:
+            self.twm.join()
+        except KeyboardInterrupt:
+            log.info("\n[SHUTDOWN] Stopping trader...")
+            self.shutdown()
+
+    def run_polling(self):
+        """
+        REST fallback for when the websocket is unavailable
+        
+        Wakes once per minute, just after the candle boundary, and
+        processes the latest closed candle.
+        """
+        self._log_banner("REST polling")
         
         while True:
             try:
-                #  get new ltf candle 
-                candle_ltf, ts = self.fetch_latest_closed_candle()
-                
-                # Skip if same candle (already processed)
-                if ts == self.last_candle_ts:
-                    time.sleep(30)
-                    continue
+                closed = self.fetch_closed_candles()
                 
-                self.last_candle_ts = ts
+                # Only candles not processed yet (just the latest on startup);
+                # a missed cycle is caught up instead of skipped
+                if self._last_candle_ts is None:
+                    new_candles = closed[-1:]
+                else:
+                    new_candles = [(c, ts) for c, ts in closed if ts > self._last_candle_ts]
                 
-                #  alignment phase
-                if not self._alignment_complete:
-                    current_minute = ts.minute
-                    
-                    if current_minute % 5 == 0:
-                        # Perfect! We're on a 5-minute boundary
-                        self._alignment_complete = True
-                        print(f"[ALIGNMENT] Aligned at {ts}")
-                        print(f"[ALIGNMENT] Starting strategy execution\n")
-                    else:
-                        # Not aligned yet, skip this candle
-                        print(f"[ALIGNMENT] Waiting... (minute {current_minute}, "
-                              f"need multiple of 5)")
-                        time.sleep(30)
-                        continue
+                if not new_candles:
+                    # Clock drift / late publish: newest candle not closed yet
+                    time.sleep(POLL_RETRY_SECONDS)
+                    continue
                 
-                #  if not aligned process candles
+                for candle_ltf, ts in new_candles:
+                    self._on_closed_candle(candle_ltf, ts)
                 
-                #  Making pending HTF available
-                if self._htf_available_next and self._htf_pending is not None:
-                    self.htf_candles.append(self._htf_pending)
-                    self.htf_count += 1
-                    
-                    print(f"[HTF #{self.htf_count}] "
-                          f"{self._htf_pending.open:.2f}→{self._htf_pending.close:.2f} | "
-                          f"{'GREEN' if self._htf_pending.is_green else 'RED'}")
-                    
-                    self._htf_pending = None
-                    self._htf_available_next = False
+                _sleep_to_next_minute()
                 
-                #  Count and store LTF candle
-                self.candle_count += 1
-                self.ltf_candles.append(candle_ltf)
+            except KeyboardInterrupt:
+                log.info("\n[SHUTDOWN] Stopping trader...")
+                self.shutdown()
+                break
+            except Exception as e:
+                log.exception(f"[ERROR] {e}")
+                _sleep_to_next_minute()
+
+    def _on_kline(self, msg: dict):
+        """Kline stream callback (runs on the websocket thread)"""
+        if msg.get("e") == "error":
+            log.error(f"[ERROR] Websocket: {msg.get('m')}")
+            return
+        
+        k = msg["k"]
+        
+        # Only act on closed candles (fires once per candle)
+        if not k["x"]:
+            return
+        
+        candle_ltf = Candle(
+            open=float(k["o"]),
+            close=float(k["c"])
+        )
+        ts = datetime.fromtimestamp(k["t"] / 1000)
+        
+        self._on_closed_candle(candle_ltf, ts)
+
+    def _on_closed_candle(self, candle_ltf: Candle, ts: datetime):
+        """
+        Entry point for every closed LTF candle (websocket or polling)
+        
+        Candles already seen are dropped. Candles missed in between (e.g.
+        while the websocket silently reconnects) are backfilled over REST
+        first, so candle/HTF numbering stays on the 5-minute grid.
+        """
+        with self._lock:
+            last_ts = self._last_candle_ts
+            if last_ts is not None and ts <= last_ts:
+                return
+            
+            if last_ts is not None and ts - last_ts > CANDLE_INTERVAL:
+                for missed_candle, missed_ts in self._fetch_missed_candles(last_ts, ts):
+                    self._process_candle(missed_candle, missed_ts)
+            
+            self._process_candle(candle_ltf, ts)
+            self._last_candle_ts = ts
+
+    def _fetch_missed_candles(self, last_ts: datetime, ts: datetime) -> list[tuple[Candle, datetime]]:
+        """
+        Backfill the closed candles strictly between last_ts and ts over REST
+        
+        If they cannot all be fetched, the feed is reset and alignment re-run
+        (processing the next candle as contiguous would shift every later
+        HTF bucket off the 5-minute boundary).
+        """
+        expected = int((ts - last_ts) / CANDLE_INTERVAL) - 1
+        
+        try:
+            klines = self.client.get_klines(
+                symbol=self.symbol,
+                interval=Client.KLINE_INTERVAL_1MINUTE,
+                startTime=int((last_ts + CANDLE_INTERVAL).timestamp() * 1000),
+                endTime=int((ts - CANDLE_INTERVAL).timestamp() * 1000),
+                limit=1000
+            )
+        except Exception as e:
+            log.error(f"[ERROR] Backfill failed: {e}")
+            klines = []
+        
+        missed = [
+            (
+                Candle(open=float(k[1]), close=float(k[4])),
+                datetime.fromtimestamp(k[0] / 1000)
+            )
+            for k in klines
+        ]
+        
+        if len(missed) != expected:
+            log.warning(f"[GAP] {expected} candle(s) missing between {last_ts} and {ts}, "
+                        f"backfilled {len(missed)}; re-aligning "
+                        f"(live_candles.csv has a gap here)")
+            self.feed = CandleFeed()
+            self._alignment_complete = False
+            return []
+        
+        log.warning(f"[GAP] {expected} candle(s) missing between {last_ts} and {ts}; "
+                    f"backfilled over REST")
+        return missed
+
+    def _process_candle(self, candle_ltf: Candle, ts: datetime):
+        """
+        Process one closed LTF candle (caller holds self._lock)
+        
+        Flow:
+        1. Wait for 5-minute alignment
+        2. Make pending HTF available (if any)
+        3. Store new LTF candle
+        4. Aggregate into HTF
+        5. Generate signal
+        6. Execute order
+        7. Log everything
+        """
+        try:
+            #  alignment phase
+            if not self._alignment_complete:
+                current_minute = ts.minute
                 
-                # Log to CSV (for backtest replay)
-                self.candle_writer.writerow({
-                    "timestamp": ts,
-                    "open": candle_ltf.open,
-                    "close": candle_ltf.close
-                })
+                if current_minute % 5 == 0:
+                    # Perfect! We're on a 5-minute boundary
+                    self._alignment_complete = True
+                    log.info(f"[ALIGNMENT] Aligned at {ts}\n"
+                             f"[ALIGNMENT] Starting strategy execution\n")
+                else:
+                    # Not aligned yet, skip this candle
+                    log.info(f"[ALIGNMENT] Waiting... (minute {current_minute}, "
+                             f"need multiple of 5)")
+                    return
+            
+            #  if not aligned process candles
+            
+            #  Store LTF candle, make pending HTF available, aggregate into HTF
+            released_htf, completed_htf = self.feed.add(candle_ltf)
+            
+            if released_htf is not None:
+                log.debug("[HTF #%d] %.2f→%.2f | %s",
+                          self.feed.htf_count, released_htf.open, released_htf.close,
+                          "GREEN" if released_htf.is_green else "RED")
+            
+            # Log to CSV (for backtest replay)
+            self.candle_writer.writerow({
+                "timestamp": ts,
+                "open": candle_ltf.open,
+                "close": candle_ltf.close
+            })
+            self._writes_since_flush += 1
+            if self._writes_since_flush >= CANDLE_FLUSH_EVERY:
                 self.candle_file.flush()
+                self._writes_since_flush = 0
+            
+            log.debug("\n[LTF #%d] %s | %.2f→%.2f | %s",
+                      self.feed.candle_count, ts, candle_ltf.open, candle_ltf.close,
+                      "GREEN" if candle_ltf.is_green else "RED")
+            
+            if completed_htf is not None:
+                log.debug("[HTF COMPLETED] %.2f→%.2f | Available next candle",
+                          completed_htf.open, completed_htf.close)
+            
+            #  Check minimum data
+            if self.feed.candle_count < 2 or self.feed.htf_count < 1:
+                log.debug("[WAITING] Need more data: LTF=%d/2, HTF=%d/1",
+                          self.feed.candle_count, self.feed.htf_count)
+                return
+            
+            #  Generate signal
+            signal = self.strategy.generate_signal(
+                self.feed.prev_ltf,
+                self.feed.cur_ltf,
+                self.feed.cur_htf,
+                position_open=(self.current_trade is not None)
+            )
+            
+            # Per-candle signal only at debug level; INFO when it changes
+            position_status = "OPEN" if self.current_trade else "FLAT"
+            level = logging.INFO if signal is not self._last_signal else logging.DEBUG
+            log.log(level, "[SIGNAL] %s | Position: %s", signal.value, position_status)
+            self._last_signal = signal
+            
+            price = candle_ltf.close
+            
+            #  Execute orders                
+            if signal == Signal.BUY and self.current_trade is None:
+                log.info(f"\n{'='*80}\n"
+                         f"[ENTRY] Candle #{self.feed.candle_count} @ {ts}\n"
+                         f"        Price: ${price:.2f} | HTF: #{self.feed.htf_count}\n"
+                         f"{'='*80}\n")
                 
-                print(f"\n[LTF #{self.candle_count}] {ts} | "
-                      f"{candle_ltf.open:.2f}→{candle_ltf.close:.2f} | "
-                      f"{'GREEN' if candle_ltf.is_green else 'RED'}")
-                
-                #  Aggregate into HTF
-                self._htf_bucket.append(candle_ltf)
-                
-                if len(self._htf_bucket) == 5:
-                    #  LTF candles collected -> HTF complete
-                    htf_candle = Candle(
-                        open=self._htf_bucket[0].open,
-                        close=self._htf_bucket[-1].close
-                    )
-                    
-                    # Store as pending (available next candle)
-                    self._htf_pending = htf_candle
-                    self._htf_available_next = True
-                    self._htf_bucket.clear()
-                    
-                    print(f"[HTF COMPLETED] "
-                          f"{htf_candle.open:.2f}→{htf_candle.close:.2f} | "
-                          f"Available next candle")
-                
-                #  Check minimum data
-                if len(self.ltf_candles) < 2 or len(self.htf_candles) < 1:
-                    print(f"[WAITING] Need more data: "
-                          f"LTF={len(self.ltf_candles)}/2, HTF={len(self.htf_candles)}/1")
-                    time.sleep(30)
-                    continue
-                
-                #  Generate signal
-                signal = self.strategy.generate_signal(
-                    self.ltf_candles,
-                    self.htf_candles,
-                    position_open=(self.current_trade is not None)
-                )
+                # Execute buy
+                self.place_market_buy(quote_amount=100.0)
                 
-                position_status = "OPEN" if self.current_trade else "FLAT"
-                print(f"[SIGNAL] {signal.value} | Position: {position_status}")
+                # Track trade
+                self.current_trade = {
+                    "symbol": self.symbol,
+                    "direction": "LONG",
+                    "entry_time": ts,
+                    "entry_price": price,
+                    "entry_candle": self.feed.candle_count,
+                    "entry_htf": self.feed.htf_count
+                }
+            
+            elif signal == Signal.SELL and self.current_trade is not None:
+                # Execute sell
+                self.place_market_sell()
                 
-                price = candle_ltf.close
+                # Complete trade record
+                self.current_trade.update({
+                    "exit_time": ts,
+                    "exit_price": price,
+                    "exit_candle": self.feed.candle_count,
+                    "exit_htf": self.feed.htf_count
+                })
                 
-                #  Execute orders                
-                if signal == Signal.BUY and self.current_trade is None:
-                    print(f"\n{'='*80}")
-                    print(f"[ENTRY] Candle #{self.candle_count} @ {ts}")
-                    print(f"        Price: ${price:.2f} | HTF: #{self.htf_count}")
-                    print(f"{'='*80}\n")
-                    
-                    # Execute buy
-                    self.place_market_buy(quote_amount=100.0)
-                    
-                    # Track trade
-                    self.current_trade = {
-                        "symbol": self.symbol,
-                        "direction": "LONG",
-                        "entry_time": ts,
-                        "entry_price": price,
-                        "entry_candle": self.candle_count,
-                        "entry_htf": self.htf_count
-                    }
+                # Calculate P&L
+                pnl = price - self.current_trade["entry_price"]
+                pnl_pct = (pnl / self.current_trade["entry_price"]) * 100
                 
-                elif signal == Signal.SELL and self.current_trade is not None:
-                    print(f"\n{'='*80}")
-                    print(f"[EXIT] Candle #{self.candle_count} @ {ts}")
-                    print(f"       Price: ${price:.2f} | HTF: #{self.htf_count}")
-                    
-                    # Execute sell
-                    self.place_market_sell()
-                    
-                    # Complete trade record
-                    self.current_trade.update({
-                        "exit_time": ts,
-                        "exit_price": price,
-                        "exit_candle": self.candle_count,
-                        "exit_htf": self.htf_count
-                    })
-                    
-                    # Calculate P&L
-                    pnl = price - self.current_trade["entry_price"]
-                    pnl_pct = (pnl / self.current_trade["entry_price"]) * 100
-                    
-                    print(f"       Entry: ${self.current_trade['entry_price']:.2f}")
-                    print(f"       P&L: ${pnl:.2f} ({pnl_pct:+.2f}%)")
-                    print(f"{'='*80}\n")
-                    
-                    # Log to CSV
-                    self.trade_writer.writerow(self.current_trade)
-                    self.trade_file.flush()
-                    
-                    # Reset
-                    self.current_trade = None
+                log.info(f"\n{'='*80}\n"
+                         f"[EXIT] Candle #{self.feed.candle_count} @ {ts}\n"
+                         f"       Price: ${price:.2f} | HTF: #{self.feed.htf_count}\n"
+                         f"       Entry: ${self.current_trade['entry_price']:.2f}\n"
+                         f"       P&L: ${pnl:.2f} ({pnl_pct:+.2f}%)\n"
+                         f"{'='*80}\n")
                 
-                # Wait for next candle
-                time.sleep(30)
+                # Log to CSV
+                self.trade_writer.writerow(self.current_trade)
+                self.trade_file.flush()
                 
-            except KeyboardInterrupt:
-                print("\n[SHUTDOWN] Stopping trader...")
-                self.shutdown()
-                break
-            except Exception as e:
-                print(f"[ERROR] {e}")
-                import traceback
-                traceback.print_exc()
-                time.sleep(30)
-    
+                # Reset
+                self.current_trade = None
+            
+        except Exception as e:
+            log.exception(f"[ERROR] {e}")
+
     def shutdown(self):     
         
-        print("Shutting down")        
+        log.info("Shutting down")
         
-        print(f"\nSession Statistics:")
-        print(f"  Candles processed: {self.candle_count}")
-        print(f"  HTF candles: {self.htf_count}")
-        
-        # Close open position if any
-        if self.current_trade is not None:
-            print(f"\n Closing open position...")
-            try:
-                self.place_market_sell()
-                print("Position closed")
-            except Exception as e:
-                print(f" Failed to close: {e}")
+        # Stop the stream, then wait for any candle still being processed
+        self.twm.stop()
         
-        # Close files
-        self.trade_file.close()
-        self.candle_file.close()
+        with self._lock:
+            log.info(f"\nSession Statistics:\n"
+                     f"  Candles processed: {self.feed.candle_count}\n"
+                     f"  HTF candles: {self.feed.htf_count}")
+            
+            # Close open position if any
+            if self.current_trade is not None:
+                log.info(f"\n Closing open position...")
+                try:
+                    self.place_market_sell()
+                    log.info("Position closed")
+                except Exception as e:
+                    log.error(f" Failed to close: {e}")
+            
+            # Close files (flushes any buffered candles)
+            self.trade_file.close()
+            self.candle_file.close()
         
         
 
 if __name__ == "__main__":  
+    
+    parser = argparse.ArgumentParser(description="Pullback strategy live trader")
+    parser.add_argument(
+        "--verbose",
+        action="store_true",
+        help="Log every candle, HTF and signal (default: only signal changes and trades)"
+    )
+    parser.add_argument(
+        "--poll",
+        action="store_true",
+        help="Poll the REST API once per minute instead of using the kline websocket"
+    )
+    args = parser.parse_args()
+    
+    logging.basicConfig(
+        level=logging.DEBUG if args.verbose else logging.INFO,
+        format="%(message)s"
+    )
+    # Keep third-party (websocket/urllib3) chatter out of --verbose output
+    logging.getLogger("binance").setLevel(logging.WARNING)
+    logging.getLogger("urllib3").setLevel(logging.WARNING)
         
     # Create and run trader
     trader = LiveTrader(API_KEY, API_SECRET, symbol="BTCUSDT")
     
     try:
-        trader.run()
+        if args.poll:
+            trader.run_polling()
+        else:
+            trader.run()
     except KeyboardInterrupt:
         trader.shutdown()
\ No newline at end of file
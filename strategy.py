@@ -11,9 +11,15 @@ This is a STATELESS strategy - it doesn't track positions internally.
 The execution layer (backtest/live) handles state management.
 """
 
+import hashlib
+import inspect
 from enum import Enum
-from dataclasses import dataclass
-from typing import List
+from dataclasses import dataclass, field
+from typing import Optional, Tuple
+
+import numpy as np
+
+from utils._njit import njit
 
 
 class Signal(Enum):
@@ -23,28 +29,27 @@ class Signal(Enum):
     HOLD = "HOLD"
 
 
-@dataclass
+# Bound once at import: avoids the enum attribute lookup on every candle
+_BUY, _SELL, _HOLD = Signal.BUY, Signal.SELL, Signal.HOLD
+
+
+@dataclass(frozen=True, slots=True)
 class Candle:
     """
     Simple candle representation with open and close prices
+
+    is_green / is_red / body are computed once at construction.
     """
     open: float
     close: float
-    
-    @property
-    def is_green(self) -> bool:
-        """Bullish candle (close > open)"""
-        return self.close > self.open
-    
-    @property
-    def is_red(self) -> bool:
-        """Bearish candle (close < open)"""
-        return self.close < self.open
-    
-    @property
-    def body(self) -> float:
-        """Candle body size. Positive = green, Negative = red"""
-        return self.close - self.open
+    is_green: bool = field(init=False, repr=False)   # Bullish candle (close > open)
+    is_red: bool = field(init=False, repr=False)     # Bearish candle (close < open)
+    body: float = field(init=False, repr=False)      # Positive = green, Negative = red
+
+    def __post_init__(self):
+        object.__setattr__(self, "is_green", self.close > self.open)
+        object.__setattr__(self, "is_red", self.close < self.open)
+        object.__setattr__(self, "body", self.close - self.open)
 
 
 class PullbackStrategy:
@@ -52,49 +57,220 @@ class PullbackStrategy:
     HTF Trend + LTF Pullback Strategy
     
     Pure strategy logic - no state, no execution, just signal generation.
-    Same code used for both backtest and live trading.
+    Per-candle implementation, used by live trading. compute_signals is the
+    vectorized implementation used by backtests; check_parity.py keeps the
+    two in lockstep.
     """
     
     def generate_signal(
         self, 
-        ltf_candles: List[Candle], 
-        htf_candles: List[Candle],
+        prev_ltf: Optional[Candle],
+        cur_ltf: Optional[Candle],
+        cur_htf: Optional[Candle],
         position_open: bool = False
     ) -> Signal:
         """
         Generate trading signal based on multi-timeframe analysis
         
         Args:
-            ltf_candles: List of closed LTF candles (chronologically ordered)
-            htf_candles: List of closed HTF candles (chronologically ordered)
+            prev_ltf: Previous closed LTF candle (None if not available yet)
+            cur_ltf: Most recent closed LTF candle
+            cur_htf: Most recent available HTF candle (None if not available yet)
             position_open: Whether a position is currently open
             
         Returns:
             Signal.BUY, Signal.SELL, or Signal.HOLD
         """
         # Need at least 2 LTF candles and 1 HTF candle
-        if len(ltf_candles) < 2 or len(htf_candles) < 1:
-            return Signal.HOLD
-
-        # Get relevant candles
-        current_ltf = ltf_candles[-1]
-        previous_ltf = ltf_candles[-2]
-        current_htf = htf_candles[-1]
+        if prev_ltf is None or cur_ltf is None or cur_htf is None:
+            return _HOLD
 
         # HTF must be green (uptrend filter)
-        if not current_htf.is_green:
-            return Signal.HOLD
+        if not cur_htf.is_green:
+            return _HOLD
 
         # Entry Logic: Pullback continuation pattern
         if not position_open:
             # Previous candle red (pullback) + Current candle green (buyers return)
-            if previous_ltf.is_red and current_ltf.is_green:
-                return Signal.BUY
+            if prev_ltf.is_red and cur_ltf.is_green:
+                return _BUY
 
         # Exit Logic: Momentum breaks
         if position_open:
             # Current candle turns red (sellers take control)
-            if current_ltf.is_red:
-                return Signal.SELL
+            if cur_ltf.is_red:
+                return _SELL
+
+        return _HOLD
+
+
+class CandleFeed:
+    """
+    Per-candle LTF storage and HTF aggregation for live trading
+    
+    Every 5 LTF candles form one HTF candle, which becomes available on the
+    LTF candle AFTER it completes (no look-ahead). Only what generate_signal
+    needs is kept: the last 2 LTF candles and the last available HTF.
+    """
+    
+    def __init__(self):
+        self.prev_ltf: Optional[Candle] = None   # Previous closed LTF candle
+        self.cur_ltf: Optional[Candle] = None    # Latest closed LTF candle
+        self.cur_htf: Optional[Candle] = None    # Latest available HTF candle
+        
+        # Metrics (1-based numbering)
+        self.candle_count = 0
+        self.htf_count = 0
+        
+        self._bucket_idx = 0            # Position of next LTF in current HTF (0-4)
+        self._bucket_open = 0.0         # Open of current HTF (first LTF open)
+        
+        # HTF Delay Implementation (CRITICAL FOR PARITY)
+        self._htf_pending: Optional[Candle] = None  # HTF that just completed
+        self._htf_release_at = 0        # Candle number on which pending HTF becomes available
+    
+    def add(self, candle: Candle) -> Tuple[Optional[Candle], Optional[Candle]]:
+        """
+        Store a closed LTF candle
+        
+        Returns:
+            (released_htf, completed_htf): the HTF made available on this
+            candle and the HTF completed by it (None when there is none)
+        """
+        self.candle_count += 1
+        
+        # Make pending HTF available
+        released_htf = None
+        if self.candle_count == self._htf_release_at:
+            released_htf = self.cur_htf = self._htf_pending
+            self.htf_count += 1
+            self._htf_pending = None
+        
+        self.prev_ltf, self.cur_ltf = self.cur_ltf, candle
+        
+        # Aggregate into HTF
+        if self._bucket_idx == 0:
+            self._bucket_open = candle.open
+        
+        completed_htf = None
+        if self._bucket_idx == 4:
+            # Store as pending (available next candle)
+            completed_htf = self._htf_pending = Candle(
+                open=self._bucket_open,
+                close=candle.close
+            )
+            self._htf_release_at = self.candle_count + 1
+        
+        self._bucket_idx = (self._bucket_idx + 1) % 5
+        
+        return released_htf, completed_htf
 
-        return Signal.HOLD
\ No newline at end of file
+
+def compute_signals(open_arr: np.ndarray, close_arr: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Vectorized version of PullbackStrategy.generate_signal over a full LTF series
+
+    HTF candles are built from consecutive buckets of 5 LTF candles and only
+    become available on the LTF candle AFTER the bucket completes, like
+    CandleFeed. This is a second implementation of the same rules: any change
+    here or in PullbackStrategy / CandleFeed must be mirrored in the other,
+    and check_parity.py must still pass.
+
+    Args:
+        open_arr: LTF open prices (chronologically ordered)
+        close_arr: LTF close prices (chronologically ordered)
+
+    Returns:
+        (buy_mask, sell_mask) boolean arrays, one entry per LTF candle.
+        Position state is NOT applied here - see _walk_trades.
+    """
+    open_arr = np.asarray(open_arr, dtype=np.float64)
+    close_arr = np.asarray(close_arr, dtype=np.float64)
+    n = len(close_arr)
+
+    ltf_green = close_arr > open_arr
+    ltf_red = close_arr < open_arr
+
+    # HTF from complete buckets only (a trailing partial bucket never closes)
+    n_htf = n // 5
+    htf_open = open_arr[:n_htf * 5:5]
+    htf_close = close_arr[4:n_htf * 5:5]
+    htf_green = htf_close > htf_open
+
+    # Bucket k completes on LTF candle 5k+4 and is available from 5k+5 onwards
+    htf_green_ltf = np.zeros(n, dtype=bool)
+    if n > 5:
+        htf_green_ltf[5:] = np.repeat(htf_green, 5)[:n - 5]
+
+    # HTF must be green for both entry and exit (uptrend filter comes first).
+    # Combined in place: the masks reuse the ltf_green / htf_green_ltf buffers.
+    # Entry: previous LTF red + current LTF green
+    buy_mask = np.logical_and(htf_green_ltf, ltf_green, out=ltf_green)
+    buy_mask[1:] &= ltf_red[:-1]
+    buy_mask[:1] = False
+
+    # Exit: current LTF red
+    sell_mask = np.logical_and(htf_green_ltf, ltf_red, out=htf_green_ltf)
+
+    return buy_mask, sell_mask
+
+
+@njit(cache=True)
+def _walk_trades(buy_mask: np.ndarray, sell_mask: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    """
+    Apply position state to the signal masks (only BUY when flat, only SELL when open)
+
+    Returns:
+        (entry_indices, exit_indices) as int64 arrays. If a position is still
+        open at the end, there is one more entry than exit.
+    """
+    n = len(buy_mask)
+    entries = np.empty(n, dtype=np.int64)
+    exits = np.empty(n, dtype=np.int64)
+    n_entries = 0
+    n_exits = 0
+    position_open = False
+
+    for i in range(n):
+        if position_open:
+            if sell_mask[i]:
+                exits[n_exits] = i
+                n_exits += 1
+                position_open = False
+        elif buy_mask[i]:
+            entries[n_entries] = i
+            n_entries += 1
+            position_open = True
+
+    return entries[:n_entries], exits[:n_exits]
+
+
+@njit(cache=True)
+def _completed_trades(buy_mask: np.ndarray, sell_mask: np.ndarray) -> np.ndarray:
+    """
+    Closed trades from the signal masks
+
+    Returns:
+        (n_trades, 2) int64 array of [entry_index, exit_index]. A position
+        still open at the end is not included.
+    """
+    entries, exits = _walk_trades(buy_mask, sell_mask)
+    trades = np.empty((len(exits), 2), dtype=np.int64)
+    trades[:, 0] = entries[:len(exits)]
+    trades[:, 1] = exits
+    return trades
+
+
+def _kernel_hash() -> int:
+    """
+    Hash of the trade-walk kernel source
+
+    Baked into the AOT build (strategy_aot.py) so a stale strategy_ext
+    can be detected after _walk_trades / _completed_trades change.
+    """
+    source = "".join(
+        inspect.getsource(getattr(func, "py_func", func))
+        for func in (_walk_trades, _completed_trades)
+    )
+    # First 60 bits: fits the int64 return type of the exported function
+    return int(hashlib.sha256(source.encode()).hexdigest()[:15], 16)
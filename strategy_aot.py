@@ -0,0 +1,37 @@
+"""
+Ahead-of-time build of the backtest trade walk
+
+Compiles strategy._completed_trades into a native extension module
+(strategy_ext) so backtests do not pay numba's JIT compile on first run.
+
+Usage (once, after installing requirements):
+    python strategy_aot.py
+
+backtest.py imports strategy_ext when it exists and was built from the
+current kernel source (kernel_hash), and falls back to the JIT-compiled
+version otherwise.
+"""
+
+from numba.pycc import CC
+
+from strategy import _completed_trades, _kernel_hash
+
+cc = CC("strategy_ext")
+
+KERNEL_HASH = _kernel_hash()
+
+
+@cc.export("walk_trades", "i8[:,:](b1[:], b1[:])")
+def walk_trades(buy_mask, sell_mask):
+    """(n_trades, 2) array of [entry_index, exit_index] for closed trades"""
+    return _completed_trades(buy_mask, sell_mask)
+
+
+@cc.export("kernel_hash", "i8()")
+def kernel_hash():
+    """Source hash of the kernel this extension was built from"""
+    return KERNEL_HASH
+
+
+if __name__ == "__main__":
+    cc.compile()
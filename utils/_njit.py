@@ -0,0 +1,20 @@
+"""
+Numba njit with a no-op fallback
+
+Lets the strategy kernels run (slowly, as plain Python) when numba
+is not installed, e.g. under PyPy.
+"""
+
+try:
+    from numba import njit
+except ImportError:  # pragma: no cover - depends on environment
+    def njit(*args, **kwargs):
+        """Fallback: return the function unchanged"""
+        # Used bare: @njit
+        if len(args) == 1 and callable(args[0]) and not kwargs:
+            return args[0]
+
+        # Used with options: @njit(cache=True)
+        def decorator(func):
+            return func
+        return decorator